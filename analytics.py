@@ -0,0 +1,248 @@
+import argparse
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy.stats import linregress, zscore
+
+from cache_backend import cache_key, get_cache_backend
+from data_store import DATA_PATH, MONTH_COLUMN, get_data_version, load_dataset
+
+logger = logging.getLogger(__name__)
+
+# Default process pool size; the per-task work is tiny at monthly granularity, so serial
+# is fastest here. Raise --workers for daily/hourly data.
+DEFAULT_WORKERS = 1
+
+# Pivot shared with pool workers once through the initializer instead of pickled per task
+_worker_pivot = None
+
+# Predefined Categorizations (ported from analysis.ipynb)
+primary_categories = {
+    'urban': ['Toronto Downtown', 'Downtown Vancouver', 'Edmonton Central Eas', 'Ottawa Downtown', 'Calgary Central2', 'Saskatoon', 'Regina', 'Winnipeg_Ellens', 'Kingston', 'Greystone Heights', 'SPARTAN - Halifax'],
+    'wildfire-prone': ['Bonner Lake', 'Radisson', 'Chapais', 'Wood Buffalo Park', 'Snare Rapids', 'Fort Chipewyan', 'Buffalo Narrows', 'Pickle Lake', 'Experimental Lakes', 'Rés. Faun. Ashuapmus', 'Mont-Saint-Michel', 'Beausejour', 'Pinehouse Lake', 'Joussard', 'Beaverlodge', 'Vanderhoof Courthous', 'Burns Lake Fire Cent', 'Houston Firehall', 'Searchmont', 'Dorset', 'Parry Sound', 'Notre-Dame-du-Rosair', 'Auclair', 'FIREHALL-LABRADORCIT', 'Goose Bay'],
+    'mixed': ['St-Dominique', 'Brandon', 'FREDERICTON', 'CHARLOTTETOWN', 'Thunder Bay', 'Rouyn-Noranda - Parc', 'Kelowna KLO Road', 'PRINCE ALBERT', 'Town of Peace River', 'Flin Flon', 'FORT ST JOHN LEARNIN', 'PRG Plaza 400', 'Quesnel Johnston Ave', 'Whitehorse NAPS', 'Smithers Muheim Memo', 'Courtenay Elementary', 'Sault Ste Marie', 'Sudbury', 'North Bay', 'Con Area Yellowknife', 'BATHURST', 'SYDNEY']
+}
+coastal_cities = ['Downtown Vancouver', 'SPARTAN - Halifax', 'CHARLOTTETOWN', 'SYDNEY', 'Courtenay Elementary', 'BATHURST', 'Goose Bay', 'FIREHALL-LABRADORCIT', 'Notre-Dame-du-Rosair']
+
+# Analysis periods: (months, first year, last year, last month start included)
+fire_season_months = [5, 6, 7, 8, 9]
+non_fire_season_months = [1, 2, 3, 4, 10, 11, 12]
+analysis_periods = {
+    "Wildfire Season": (fire_season_months, 2018, 2024, None),
+    "Full Year": (None, None, None, "2025-03-07"),
+    "Non-Wildfire Season": (non_fire_season_months, None, None, "2025-03-07"),
+}
+
+# Correlation strength bins, checked in order
+correlation_bins = [
+    ('Strong Positive (>0.3)', lambda x: x > 0.3),
+    ('Weak Positive (0 to 0.3)', lambda x: (x >= 0) & (x <= 0.3)),
+    ('Near Zero (-0.1 to 0)', lambda x: (x > -0.1) & (x < 0)),
+    ('Weak Negative (-0.3 to -0.1)', lambda x: (x >= -0.3) & (x <= -0.1)),
+    ('Strong Negative (<-0.3)', lambda x: x < -0.3),
+]
+
+
+def build_pivot(df):
+    """Pivot the dataset once into one row per (City, month) with pm2.5 and o₃ columns."""
+    # Pair pollutants on the normalized month; source timestamps carry differing UTC offsets
+    pivot_df = df.pivot_table(index=['City', MONTH_COLUMN],
+                              columns='Sensor Parameter',
+                              values='Monthly Average').dropna()
+    # Same guard as analysis.ipynb (a no-op on validated data, which masks negative averages)
+    pivot_df = pivot_df[pivot_df['o₃'] >= 0]
+    return pivot_df[['pm2.5', 'o₃']]
+
+
+def init_worker(pivot_df):
+    """Pool initializer: keep the pivot in the worker so tasks only carry their parameters."""
+    global _worker_pivot
+    _worker_pivot = pivot_df
+
+
+def select_period(pivot_df, period_name):
+    """Return the rows of the pivot that fall within an analysis period."""
+    months, first_year, last_year, end = analysis_periods[period_name]
+    month_start = pivot_df.index.get_level_values(MONTH_COLUMN)
+    mask = np.ones(len(pivot_df), dtype=bool)
+    if months is not None:
+        mask &= month_start.month.isin(months)
+    if first_year is not None:
+        mask &= (month_start.year >= first_year) & (month_start.year <= last_year)
+    if end is not None:
+        mask &= month_start <= pd.Timestamp(end, tz='UTC')
+    return pivot_df[mask]
+
+
+def category_correlation(task):
+    """Worker: PM2.5/O₃ correlation for one (period, categorization, category)."""
+    period_name, categorization, category, cities = task
+    period_df = select_period(_worker_pivot, period_name)
+    cat_df = period_df[period_df.index.get_level_values('City').isin(cities)]
+    correlation = cat_df['pm2.5'].corr(cat_df['o₃']) if not cat_df.empty else np.nan
+    return {'Period': period_name, 'Categorization': categorization, 'Category': category,
+            'Correlation': correlation, 'Months': len(cat_df)}
+
+
+def city_correlations(task):
+    """Worker: per-city PM2.5/O₃ correlations for one period, labelled by strength bin."""
+    period_name = task
+    period_df = select_period(_worker_pivot, period_name)
+    city_corrs = period_df.groupby(level='City').apply(lambda g: g['pm2.5'].corr(g['o₃'])).rename('Correlation')
+    city_corrs = city_corrs.reset_index()
+    city_corrs['Strength'] = None
+    for label, condition in correlation_bins:
+        mask = condition(city_corrs['Correlation']) & city_corrs['Strength'].isna()
+        city_corrs.loc[mask, 'Strength'] = label
+    city_corrs.insert(0, 'Period', period_name)
+    return city_corrs
+
+
+def month_trendline(task):
+    """Worker: linear trend of one pollutant's monthly wildfire-season mean across years."""
+    pollutant, month, series = task
+    series = series.dropna()
+    if len(series) < 2:
+        return {'Pollutant': pollutant, 'Month': month, 'Slope': np.nan, 'Intercept': np.nan,
+                'R': np.nan, 'P': np.nan}
+    fit = linregress(series.index.to_numpy(dtype=float), series.to_numpy())
+    return {'Pollutant': pollutant, 'Month': month, 'Slope': fit.slope, 'Intercept': fit.intercept,
+            'R': fit.rvalue, 'P': fit.pvalue}
+
+
+def season_shape(task):
+    """Worker: z-score normalized shape of one year's wildfire season."""
+    year, year_df = task
+    shape = year_df.reset_index()[['Month']].copy()
+    for pollutant in ['pm2.5', 'o₃']:
+        shape[pollutant] = zscore(year_df[pollutant].to_numpy(), nan_policy='omit')
+    shape.insert(0, 'Year', year)
+    return shape
+
+
+def fan_out(executor, func, tasks):
+    if executor is None:
+        return [func(task) for task in tasks]
+    return list(executor.map(func, tasks))
+
+
+# Stage functions take the results of their dependencies and the executor
+def stage_category_correlations(deps, executor):
+    tasks = []
+    for period_name in analysis_periods:
+        period_df = select_period(deps['pivot'], period_name)
+        inner_cities = [city for city in period_df.index.get_level_values('City').unique() if city not in coastal_cities]
+        categorizations = {
+            'Primary': primary_categories,
+            'Secondary': {'coastal': coastal_cities, 'inner': inner_cities},
+        }
+        for categorization, categories in categorizations.items():
+            for category, cities in categories.items():
+                tasks.append((period_name, categorization, category, cities))
+    return pd.DataFrame(fan_out(executor, category_correlation, tasks))
+
+
+def stage_city_correlations(deps, executor):
+    return pd.concat(fan_out(executor, city_correlations, list(analysis_periods)), ignore_index=True)
+
+
+def stage_yearly_trends(deps, executor):
+    full_df = select_period(deps['pivot'], "Full Year").reset_index()
+    full_df['Year'] = full_df[MONTH_COLUMN].dt.year
+    return full_df.groupby('Year')[['pm2.5', 'o₃']].mean().reset_index()
+
+
+def stage_monthly_wildfire_trends(deps, executor):
+    pivot_df = deps['pivot'].reset_index()
+    month_start = pivot_df[MONTH_COLUMN]
+    season_df = pivot_df[month_start.dt.month.isin(fire_season_months)]
+    return season_df.groupby([season_df[MONTH_COLUMN].dt.year.rename('Year'),
+                              season_df[MONTH_COLUMN].dt.month.rename('Month')])[['pm2.5', 'o₃']].mean().reset_index()
+
+
+def stage_trendlines(deps, executor):
+    monthly_trends = deps['monthly_wildfire_trends']
+    tasks = [
+        (pollutant, month, monthly_trends[monthly_trends['Month'] == month].set_index('Year')[pollutant])
+        for pollutant in ['pm2.5', 'o₃'] for month in fire_season_months
+    ]
+    return pd.DataFrame(fan_out(executor, month_trendline, tasks))
+
+
+def stage_season_shapes(deps, executor):
+    monthly_trends = deps['monthly_wildfire_trends']
+    tasks = [(year, year_df.set_index('Month')) for year, year_df in monthly_trends.groupby('Year')]
+    return pd.concat(fan_out(executor, season_shape, tasks), ignore_index=True)
+
+
+# The DAG: stage name -> (dependencies, function). 'pivot' is built once and kept in memory.
+stages = {
+    'category_correlations': (['pivot'], stage_category_correlations),
+    'city_correlations': (['pivot'], stage_city_correlations),
+    'yearly_trends': (['pivot'], stage_yearly_trends),
+    'monthly_wildfire_trends': (['pivot'], stage_monthly_wildfire_trends),
+    'trendlines': (['monthly_wildfire_trends'], stage_trendlines),
+    'season_shapes': (['monthly_wildfire_trends'], stage_season_shapes),
+}
+
+
+def artifact_key(data_version, stage):
+    return cache_key(data_version, "analytics", stage)
+
+
+def load_artifact(cache, data_version, stage):
+    """Return a stage's artifact for data_version, or None if the pipeline has not produced it."""
+    return cache.get_frame(artifact_key(data_version, stage))
+
+
+def run_pipeline(path=DATA_PATH, workers=DEFAULT_WORKERS, force=False, cache=None):
+    """Run every stage for the current data version, skipping stages whose artifacts exist."""
+    cache = cache or get_cache_backend()
+    data_version = get_data_version(path)
+    results = {}
+    pending = [stage for stage in stages
+               if force or not cache.contains(artifact_key(data_version, stage))]
+    logger.info(f"Data version {data_version}: {len(stages) - len(pending)} cached, {len(pending)} to run")
+    if not pending:
+        return data_version
+
+    # Pivot once; every stage fans out from this frame
+    results['pivot'] = build_pivot(load_dataset(path, data_version))
+
+    init_worker(results['pivot'])  # Serial runs read the same global as pool workers
+    executor = None
+    if workers > 1:
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(results['pivot'],))
+    try:
+        for stage, (deps, func) in stages.items():
+            if stage not in pending:
+                continue
+            for dep in deps:
+                if dep not in results:
+                    results[dep] = load_artifact(cache, data_version, dep)
+            start_time = time.time()
+            results[stage] = func({dep: results[dep] for dep in deps}, executor)
+            cache.set_frame(artifact_key(data_version, stage), results[stage])
+            logger.info(f"{stage}: {len(results[stage])} rows in {time.time() - start_time:.2f} seconds")
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    return data_version
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description="Run the air quality analytics pipeline and store its artifacts.")
+    parser.add_argument("--data", default=DATA_PATH, help="Path of the monthly aggregate CSV")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help=f"Process pool size (default {DEFAULT_WORKERS}; 1 runs serially)")
+    parser.add_argument("--force", action="store_true", help="Recompute stages even if artifacts exist")
+    args = parser.parse_args()
+
+    start_time = time.time()
+    run_pipeline(args.data, args.workers, args.force)
+    logger.info(f"Execution time: {time.time() - start_time:.2f} seconds")
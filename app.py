@@ -1,6 +1,9 @@
 import streamlit as st
 import pandas as pd
 import matplotlib.pyplot as plt
+import matplotlib.colors as mcolors
+import matplotlib.dates as mdates
+from matplotlib.collections import LineCollection, PolyCollection
 import cartopy.crs as ccrs
 import cartopy.feature as cfeature
 from datetime import datetime
@@ -8,6 +11,11 @@ import numpy as np
 import io
 import os
 import colorsys  # For HSL color manipulation
+import threading
+from data_store import DATA_PATH, DataVersionChanged, dataset_path, get_data_version, open_shared_dataset
+from cache_backend import cache_key, get_cache_backend, prune_version_dirs, prune_versions
+from rollups import available_resolutions, build_rollups, downsample_lttb, window_rollup
+from export import EXPORT_DIR, EXPORT_FORMATS, export_path, export_to_file, export_url, prune_exports
 
 # Set page config to a slightly narrower custom width
 st.set_page_config(layout="wide", page_title="Canada Air Quality Dashboard", initial_sidebar_state="collapsed")
@@ -24,95 +32,195 @@ st.markdown(
     unsafe_allow_html=True
 )
 
-# Load the monthly aggregate data
-df = pd.read_csv("air_quality_monthly_data.csv")
+# Load the monthly aggregate data, keyed on a content hash of the file (data_version).
+# The dataset is a read-only memory-mapped Arrow store shared by every session (and,
+# through the OS page cache, every process); filters return index arrays and only the
+# selected rows are materialized.
+@st.cache_resource(max_entries=2)
+def load_data(data_version):
+    return open_shared_dataset(data_version, DATA_PATH)
 
-# Ensure 'Month Start (UTC)' is in datetime format and normalize to the first of the month
-df['Month Start (UTC)'] = pd.to_datetime(df['Month Start (UTC)']).dt.normalize()
+# Shared cache for rendered maps, figures and aggregate frames (filesystem by default,
+# Redis via AQ_CACHE_URL) so a new replica starts warm instead of re-rendering everything
+@st.cache_resource
+def get_shared_cache():
+    return get_cache_backend()
 
-# Pre-generate maps for each season
-@st.cache_data
-def pregenerate_maps():
-    unique_years = sorted(df['Month Start (UTC)'].dt.year.unique())
+shared_cache = get_shared_cache()
+
+# Pointer to the data version sessions are served; a refreshed CSV only replaces it once warm
+CURRENT_VERSION_KEY = "current_version"
+
+target_pollutants = ["pm2.5", "o₃"]
+
+# Render the heatmap for one wildfire season (or some of its months) to PNG bytes
+def render_season_map(dataset, season, months=(5, 6, 7, 8, 9), title=None):
+    year = int(season.split(" ")[0])
+    season_df = dataset.frame(
+        dataset.select(years=[year], months=months),
+        ['Latitude', 'Longitude', 'Sensor Parameter', 'Monthly Average']
+    )
+
+    # Prepare data for the heatmap
+    heatmap_data = season_df.groupby(['Latitude', 'Longitude', 'Sensor Parameter'])['Monthly Average'].mean().reset_index()
+
+    # Create the map using matplotlib and cartopy
+    fig = plt.figure(figsize=(10, 8))
+    ax = fig.add_subplot(1, 1, 1, projection=ccrs.PlateCarree())
+
+    # Set the extent to focus on Canada (zoomed in)
+    ax.set_extent([-165, -52, 40, 83], crs=ccrs.PlateCarree())  # Adjusted for zoom
+
+    # Add geographic features
+    ax.add_feature(cfeature.LAND, facecolor='lightgray')
+    ax.add_feature(cfeature.OCEAN, facecolor='lightblue')
+    ax.add_feature(cfeature.COASTLINE)
+    ax.add_feature(cfeature.BORDERS, linestyle=':')
+    ax.add_feature(cfeature.LAKES, facecolor='lightblue', edgecolor='black')
+    ax.add_feature(cfeature.STATES, linestyle='--')
+
+    # Define colors and markers for each pollutant
+    pollutant_styles = {
+        "pm2.5": {"color": "red", "marker": "o", "label": "PM2.5"},
+        "o₃": {"color": "purple", "marker": "o", "label": "O₃"}
+    }
+
+    # Plot each pollutant's data
+    handles = []
+    labels = []
+    for pollutant in target_pollutants:
+        pollutant_data = heatmap_data[heatmap_data['Sensor Parameter'] == pollutant]
+        if not pollutant_data.empty:
+            # Normalize Monthly Average for sizing
+            sizes = pollutant_data['Monthly Average'] / pollutant_data['Monthly Average'].max() * 500
+            scatter = ax.scatter(
+                pollutant_data['Longitude'], pollutant_data['Latitude'],
+                s=sizes,
+                c=pollutant_styles[pollutant]["color"],
+                marker=pollutant_styles[pollutant]["marker"],
+                alpha=0.6,
+                transform=ccrs.PlateCarree()
+            )
+            # Create a handle with a fixed size for the legend
+            handle = plt.scatter([], [], s=100, c=pollutant_styles[pollutant]["color"],
+                                 marker=pollutant_styles[pollutant]["marker"],
+                                 label=pollutant_styles[pollutant]["label"])
+            handles.append(handle)
+            labels.append(pollutant_styles[pollutant]["label"])
+
+    # Add custom legend with fixed-size markers
+    ax.legend(handles=handles, labels=labels, title="Pollutants")
+    ax.set_title(f"Air Quality in Canada - {title or season}", pad=20)
+    plt.tight_layout()
+
+    # Save the figure to a BytesIO buffer
+    buf = io.BytesIO()
+    plt.savefig(buf, format='png', bbox_inches='tight')
+
+    # Close the figure to free memory
+    plt.close(fig)
+
+    return buf.getvalue()
+
+# Render any missing season maps into the shared cache and return their keys
+def build_season_maps(dataset, data_version, cache):
+    unique_years = sorted(np.unique(dataset.year))
     wildfire_seasons = [f"{year} (May-Sep)" for year in unique_years if year >= 2018 and year <= 2024]  # Exclude 2025
     preloaded_maps = {}
 
     for season in wildfire_seasons:
-        year = int(season.split(" ")[0])
-        season_df = df[
-            (df['Month Start (UTC)'].dt.year == year) &
-            (df['Month Start (UTC)'].dt.month.isin([5, 6, 7, 8, 9]))
-        ].copy()
-
-        # Prepare data for the heatmap
-        heatmap_data = season_df.groupby(['Latitude', 'Longitude', 'Sensor Parameter'])['Monthly Average'].mean().reset_index()
-
-        # Create the map using matplotlib and cartopy
-        fig = plt.figure(figsize=(10, 8))
-        ax = fig.add_subplot(1, 1, 1, projection=ccrs.PlateCarree())
-
-        # Set the extent to focus on Canada (zoomed in)
-        ax.set_extent([-165, -52, 40, 83], crs=ccrs.PlateCarree())  # Adjusted for zoom
-
-        # Add geographic features
-        ax.add_feature(cfeature.LAND, facecolor='lightgray')
-        ax.add_feature(cfeature.OCEAN, facecolor='lightblue')
-        ax.add_feature(cfeature.COASTLINE)
-        ax.add_feature(cfeature.BORDERS, linestyle=':')
-        ax.add_feature(cfeature.LAKES, facecolor='lightblue', edgecolor='black')
-        ax.add_feature(cfeature.STATES, linestyle='--')
-
-        # Define colors and markers for each pollutant
-        pollutant_styles = {
-            "pm2.5": {"color": "red", "marker": "o", "label": "PM2.5"},
-            "o₃": {"color": "purple", "marker": "o", "label": "O₃"}
-        }
-
-        # Plot each pollutant's data
-        handles = []
-        labels = []
-        for pollutant in target_pollutants:
-            pollutant_data = heatmap_data[heatmap_data['Sensor Parameter'] == pollutant]
-            if not pollutant_data.empty:
-                # Normalize Monthly Average for sizing
-                sizes = pollutant_data['Monthly Average'] / pollutant_data['Monthly Average'].max() * 500
-                scatter = ax.scatter(
-                    pollutant_data['Longitude'], pollutant_data['Latitude'],
-                    s=sizes,
-                    c=pollutant_styles[pollutant]["color"],
-                    marker=pollutant_styles[pollutant]["marker"],
-                    alpha=0.6,
-                    transform=ccrs.PlateCarree()
-                )
-                # Create a handle with a fixed size for the legend
-                handle = plt.scatter([], [], s=100, c=pollutant_styles[pollutant]["color"],
-                                     marker=pollutant_styles[pollutant]["marker"],
-                                     label=pollutant_styles[pollutant]["label"])
-                handles.append(handle)
-                labels.append(pollutant_styles[pollutant]["label"])
-
-        # Add custom legend with fixed-size markers
-        ax.legend(handles=handles, labels=labels, title="Pollutants")
-        ax.set_title(f"Air Quality in Canada - {season}", pad=20)
-        plt.tight_layout()
-
-        # Save the figure to a BytesIO buffer
-        buf = io.BytesIO()
-        plt.savefig(buf, format='png', bbox_inches='tight')
-        buf.seek(0)
-        preloaded_maps[season] = buf
-
-        # Close the figure to free memory
-        plt.close(fig)
+        key = cache_key(data_version, "maps", season)
+        if not cache.contains(key):
+            cache.set(key, render_season_map(dataset, season))
+        preloaded_maps[season] = key
 
     return preloaded_maps
 
-# Pre-generate maps at startup
-target_pollutants = ["pm2.5", "o₃"]
-preloaded_maps = pregenerate_maps()
+@st.cache_data(max_entries=2)
+def pregenerate_maps(data_version):
+    return build_season_maps(load_data(data_version), data_version, shared_cache)
+
+# Multi-resolution min/max/mean/count rollups, built once per data version and shared
+# through the cache backend so the trend chart never aggregates the raw series
+def build_rollup_levels(dataset, data_version, cache):
+    keys = {res: cache_key(data_version, "rollups", res) for res in available_resolutions(dataset.month_start)}
+    rollups = {res: cache.get_frame(key) for res, key in keys.items()}
+    if any(rollup is None for rollup in rollups.values()):
+        rollups = build_rollups(dataset)
+        for res, rollup in rollups.items():
+            cache.set_frame(keys[res], rollup)
+    return rollups
+
+# Build everything a first rerun needs for a data version, then point sessions at it.
+# Only the new and previous versions are kept; older ones are evicted from every cache.
+def warm_version(data_version):
+    dataset = open_shared_dataset(data_version, DATA_PATH)
+    build_season_maps(dataset, data_version, shared_cache)
+    build_rollup_levels(dataset, data_version, shared_cache)
+    previous_version = shared_cache.get(CURRENT_VERSION_KEY)
+    shared_cache.set(CURRENT_VERSION_KEY, data_version.encode())
+    keep_versions = [data_version]
+    if previous_version is not None:
+        keep_versions.append(bytes(previous_version).decode())
+    prune_versions(shared_cache, keep_versions)
+    prune_version_dirs(EXPORT_DIR, keep_versions)
+
+# One background warm-up per process at a time
+@st.cache_resource
+def get_warmup_state():
+    return {"lock": threading.Lock(), "version": None}
+
+def warm_in_background(data_version):
+    state = get_warmup_state()
+    with state["lock"]:
+        if state["version"] is not None:
+            return
+        state["version"] = data_version
+
+    def run():
+        try:
+            warm_version(data_version)
+        except DataVersionChanged:
+            pass  # Replaced mid-build; the next rerun warms the newer version
+        finally:
+            with state["lock"]:
+                state["version"] = None
+
+    threading.Thread(target=run, name=f"warm-{data_version}", daemon=True).start()
+
+# Choose the data version for this run. A refreshed CSV is warmed in a background
+# thread while sessions keep the previous version, so no rerun waits on the Arrow
+# store, maps and rollups; only a cold start (no warm version yet) builds inline.
+# Each script run reads data_version once, so in-flight sessions keep a consistent snapshot.
+# Stores are only built from bytes matching their version (see load_dataset), so a file
+# replaced mid-build is retried under its new version rather than saved under the old one.
+latest_version = get_data_version(DATA_PATH)
+current_version = shared_cache.get(CURRENT_VERSION_KEY)
+current_version = bytes(current_version).decode() if current_version is not None else None
+warming_version = None
+if current_version == latest_version and os.path.exists(dataset_path(latest_version)):
+    data_version = latest_version
+elif current_version is None or not os.path.exists(dataset_path(current_version)):
+    # Nothing warm to serve from this replica: build the latest version now
+    while True:
+        try:
+            warm_version(latest_version)
+            break
+        except DataVersionChanged:
+            latest_version = get_data_version(DATA_PATH)
+    data_version = latest_version
+else:
+    warm_in_background(latest_version)
+    data_version = current_version
+    warming_version = latest_version
+
+dataset = load_data(data_version)
+preloaded_maps = pregenerate_maps(data_version)
 
 # Streamlit UI
 st.title("Canada Air Quality Dashboard - Monthly Aggregates (Wildfire Focus)")
+if warming_version:
+    st.info("Newer data is being prepared; the dashboard will switch to it on a later rerun.")
 
 # Trend Graph Section
 st.header("Monthly Trend Analysis")
@@ -219,161 +327,227 @@ with col2:
     all_groups = list(location_groups.keys())
     selected_group = st.selectbox("Select a Location Group", all_groups, index=all_groups.index("Pollutant Opposition Zones"))
 
+# Rollups for the served version; warm_version has already stored them in the shared cache
+@st.cache_resource(max_entries=2)
+def load_rollups(data_version):
+    return build_rollup_levels(load_data(data_version), data_version, shared_cache)
+
+rollups = load_rollups(data_version)
+
+# Row 1b: Time window and resolution filters
+col3, col4 = st.columns(2)
+with col3:
+    all_years = sorted(np.unique(dataset.year).tolist())
+    start_year, end_year = st.select_slider("Time Window", options=all_years, value=(all_years[0], all_years[-1]))
+with col4:
+    resolution = st.radio("Resolution", list(rollups.keys()), index=0, horizontal=True)
+
+# Number of distinct months recorded per city, cached per data version
+@st.cache_data(max_entries=2)
+def city_month_counts(data_version):
+    dataset = load_data(data_version)
+    # Count distinct (city, month) pairs straight from the mapped columns
+    pairs = np.unique(np.stack([dataset.codes('City').astype(np.int64), dataset.month_start.view(np.int64)]), axis=1)
+    counts = np.bincount(pairs[0], minlength=len(dataset.categories('City')))
+    return dict(zip(dataset.categories('City'), counts.tolist()))
+
 # Flatten selected group into a list of cities and validate sample size
+month_counts = city_month_counts(data_version)
 selected_cities = []
 excluded_cities = []
 for city in location_groups[selected_group]["cities"]:
-    city_data = df[df['City'] == city]
-    if len(city_data['Month Start (UTC)'].unique()) >= 10:  # Minimum 10 months
+    if month_counts.get(city, 0) >= 10:  # Minimum 10 months
         selected_cities.append(city)
     else:
         excluded_cities.append(city)
 selected_cities = sorted(list(set(selected_cities)))  # Remove duplicates and sort
 
-# Row 2: Plot and Insights side-by-side
-col_plot, col_insight = st.columns([4, 1])
-with col_plot:
-    if selected_cities:
-        trend_data = df[df['Sensor Parameter'].isin(selected_pollutants_api) & df['City'].isin(selected_cities)].copy()
-    else:
-        trend_data = df[df['Sensor Parameter'].isin(selected_pollutants_api)].copy()
-
-    if not trend_data.empty:
-        wildfire_season_months = [5, 6, 7, 8, 9]
-        trend_data['Is Wildfire Season'] = trend_data['Month Start (UTC)'].dt.month.isin(wildfire_season_months)
-
-        # Create the figure with subplots based on the selected group
-        if selected_group == "Pollutant Opposition Zones":
-            # Single subplot for this group
-            fig, ax2 = plt.subplots(1, 1, figsize=(10, 6))
-            ax2_twin = ax2.twinx()
-            ax1 = None  # No upper subplot
-        else:
-            # Two subplots for broken axis
-            fig, (ax1, ax2) = plt.subplots(2, 1, sharex=True, figsize=(10, 6), gridspec_kw={'height_ratios': [1, 4], 'hspace': 0.05})
-            ax2_twin = ax2.twinx()
-
-        # Group-based color shades with lightness variation
-        group_color_shades = {
-            "Pollutant Synergy Zones": {"pm2.5": "#FF4500", "o₃": "#8A2BE2"},
-            "Moderate Alignment Areas": {"pm2.5": "#FF6347", "o₃": "#9932CC"},
-            "Mild Divergence Zones": {"pm2.5": "#FA8072", "o₃": "#BA55D3"},
-            "Pollutant Opposition Zones": {"pm2.5": "#F08080", "o₃": "#C71585"}
-        }
-
-        # Function to adjust lightness of a hex color
-        def adjust_lightness(hex_color, factor):
-            rgb = tuple(int(hex_color.lstrip('#')[i:i+2], 16) / 255 for i in (0, 2, 4))
-            h, l, s = colorsys.rgb_to_hls(*rgb)
-            new_l = min(max(l * factor, 0.2), 0.9)  # Limit lightness between 0.2 and 0.9
-            r, g, b = colorsys.hls_to_rgb(h, new_l, s)
-            return f"#{int(r*255):02x}{int(g*255):02x}{int(b*255):02x}"
+# Group-based color shades with lightness variation
+group_color_shades = {
+    "Pollutant Synergy Zones": {"pm2.5": "#FF4500", "o₃": "#8A2BE2"},
+    "Moderate Alignment Areas": {"pm2.5": "#FF6347", "o₃": "#9932CC"},
+    "Mild Divergence Zones": {"pm2.5": "#FA8072", "o₃": "#BA55D3"},
+    "Pollutant Opposition Zones": {"pm2.5": "#F08080", "o₃": "#C71585"}
+}
 
-        # Group data by pollutant and city for plotting
-        grouped = trend_data.groupby(['Sensor Parameter', 'City'])
+# Function to adjust lightness of a hex color
+def adjust_lightness(hex_color, factor):
+    rgb = tuple(int(hex_color.lstrip('#')[i:i+2], 16) / 255 for i in (0, 2, 4))
+    h, l, s = colorsys.rgb_to_hls(*rgb)
+    new_l = min(max(l * factor, 0.2), 0.9)  # Limit lightness between 0.2 and 0.9
+    r, g, b = colorsys.hls_to_rgb(h, new_l, s)
+    return f"#{int(r*255):02x}{int(g*255):02x}{int(b*255):02x}"
+
+# RGBA palettes for the individual city lines, computed once: city i of a group gets
+# lightness step i % 5 of its pollutant's base colour, drawn at 30% opacity
+lightness_factors = [0.8, 0.9, 1.0, 1.1, 1.2]
+city_line_palettes = {
+    (group, pollutant): mcolors.to_rgba_array([adjust_lightness(base_color, factor) for factor in lightness_factors], alpha=0.3)
+    for group, shades in group_color_shades.items()
+    for pollutant, base_color in shades.items()
+}
 
-        # Plot individual location lines with adjusted transparency
-        for idx, ((pollutant, city), group) in enumerate(grouped):
-            city_group = selected_group
-            base_color = group_color_shades.get(city_group, {"pm2.5": "red", "o₃": "purple"})[pollutant]
-            lightness_factor = 0.8 + (idx % 5) * 0.1
-            color = adjust_lightness(base_color, lightness_factor)
+# Upper bound on points drawn per line; longer series are downsampled with LTTB
+MAX_POINTS_PER_LINE = 400
+resolution_titles = {"Hour": "Hourly", "Day": "Daily", "Month": "Monthly", "Season": "Seasonal", "Year": "Yearly"}
 
+# Render the trend chart for a location group to PNG bytes (None when there is nothing to plot)
+def render_trend_chart(rollup, selected_group, selected_pollutants_api, selected_pollutants_display, selected_cities,
+                       start_year, end_year, resolution, show_range):
+    # rollup is already restricted to the time window (see window_rollup)
+    mask = rollup['Sensor Parameter'].isin(selected_pollutants_api)
+    if selected_cities:
+        mask &= rollup['City'].isin(selected_cities)
+    trend_data = rollup[mask]
+
+    if trend_data.empty:
+        return None
+
+    # Create the figure with subplots based on the selected group
+    if selected_group == "Pollutant Opposition Zones":
+        # Single subplot for this group
+        fig, ax2 = plt.subplots(1, 1, figsize=(10, 6))
+        ax2_twin = ax2.twinx()
+        ax1 = None  # No upper subplot
+    else:
+        # Two subplots for broken axis
+        fig, (ax1, ax2) = plt.subplots(2, 1, sharex=True, figsize=(10, 6), gridspec_kw={'height_ratios': [1, 4], 'hspace': 0.05})
+        ax2_twin = ax2.twinx()
+
+    # Pre-align every (pollutant, city) series into one vertex array per line, in groupby order
+    trend_data = trend_data.sort_values(['Sensor Parameter', 'City', 'Period Start (UTC)'])
+    pollutants = trend_data['Sensor Parameter'].to_numpy()
+    cities = trend_data['City'].to_numpy()
+    line_starts = np.flatnonzero(np.r_[True, (pollutants[1:] != pollutants[:-1]) | (cities[1:] != cities[:-1])])
+    vertices = np.column_stack([mdates.date2num(trend_data['Period Start (UTC)'].to_numpy()), trend_data['Mean'].to_numpy(dtype=float)])
+    segments = np.split(vertices, line_starts[1:])
+    segments = [seg[downsample_lttb(seg[:, 0], seg[:, 1], MAX_POINTS_PER_LINE)] if len(seg) > MAX_POINTS_PER_LINE else seg
+                for seg in segments]
+    line_pollutants = pollutants[line_starts]
+
+    # Draw individual location lines as one LineCollection per axis instead of one Line2D per city
+    for pollutant in np.unique(line_pollutants):
+        line_idx = np.flatnonzero(line_pollutants == pollutant)
+        colors = city_line_palettes[(selected_group, pollutant)][line_idx % len(lightness_factors)]
+        if pollutant == "pm2.5":
+            # PM2.5 goes on both subplots for the broken axis groups
+            line_axes = [ax2] if ax1 is None else [ax1, ax2]
+        else:
+            # O₃ only goes on the lower subplot's secondary y-axis
+            line_axes = [ax2_twin]
+        for line_ax in line_axes:
+            line_ax.xaxis_date()
+            line_ax.add_collection(LineCollection([segments[i] for i in line_idx], colors=colors, linewidths=1.5))
+            line_ax.autoscale_view()
+
+    # Calculate and plot overall average lines with adjusted thickness
+    for pollutant in selected_pollutants_api:
+        pollutant_data = trend_data[trend_data['Sensor Parameter'] == pollutant]
+        if not pollutant_data.empty:
+            avg_data = pollutant_data.groupby('Period Start (UTC)').agg(
+                Mean=('Mean', 'mean'), Min=('Min', 'min'), Max=('Max', 'max')
+            ).reset_index()
+            if len(avg_data) > MAX_POINTS_PER_LINE:
+                avg_data = avg_data.iloc[downsample_lttb(avg_data['Period Start (UTC)'].to_numpy().astype(np.int64), avg_data['Mean'].to_numpy(), MAX_POINTS_PER_LINE)]
+            if show_range:
+                # Coarse buckets average spikes away, so shade the per-bucket min/max range to keep peaks visible
+                range_axes = [ax2_twin] if pollutant != "pm2.5" else ([ax2] if ax1 is None else [ax1, ax2])
+                for range_ax in range_axes:
+                    range_ax.fill_between(avg_data['Period Start (UTC)'], avg_data['Min'], avg_data['Max'],
+                                          color=group_color_shades[selected_group][pollutant], alpha=0.1, linewidth=0)
             if pollutant == "pm2.5":
                 if selected_group != "Pollutant Opposition Zones":
-                    # Plot on both subplots for PM2.5 (broken axis groups)
-                    ax1.plot(group['Month Start (UTC)'], group['Monthly Average'], label=f"{city} (PM2.5)", color=color, alpha=0.3, linewidth=1.5)
-                    ax2.plot(group['Month Start (UTC)'], group['Monthly Average'], label=f"{city} (PM2.5)", color=color, alpha=0.3, linewidth=1.5)
+                    # Plot average on both subplots
+                    ax1.plot(avg_data['Period Start (UTC)'], avg_data['Mean'], label="Average PM2.5",
+                             color=group_color_shades[selected_group]["pm2.5"], alpha=1.0, linewidth=2)
+                    ax2.plot(avg_data['Period Start (UTC)'], avg_data['Mean'], label="Average PM2.5",
+                             color=group_color_shades[selected_group]["pm2.5"], alpha=1.0, linewidth=2)
                 else:
-                    # Plot on single subplot for Pollutant Opposition Zones
-                    ax2.plot(group['Month Start (UTC)'], group['Monthly Average'], label=f"{city} (PM2.5)", color=color, alpha=0.3, linewidth=1.5)
+                    # Plot average on single subplot
+                    ax2.plot(avg_data['Period Start (UTC)'], avg_data['Mean'], label="Average PM2.5",
+                             color=group_color_shades[selected_group]["pm2.5"], alpha=1.0, linewidth=2)
             else:
-                # Plot O₃ only on the lower subplot's secondary y-axis
-                ax2_twin.plot(group['Month Start (UTC)'], group['Monthly Average'], label=f"{city} (O₃)", color=color, alpha=0.3, linewidth=1.5)
-
-        # Calculate and plot overall average lines with adjusted thickness
-        for pollutant in selected_pollutants_api:
-            pollutant_data = trend_data[trend_data['Sensor Parameter'] == pollutant]
-            if not pollutant_data.empty:
-                avg_data = pollutant_data.groupby('Month Start (UTC)')['Monthly Average'].mean().reset_index()
-                if pollutant == "pm2.5":
-                    if selected_group != "Pollutant Opposition Zones":
-                        # Plot average on both subplots
-                        ax1.plot(avg_data['Month Start (UTC)'], avg_data['Monthly Average'], label="Average PM2.5",
-                                 color=group_color_shades[selected_group]["pm2.5"], alpha=1.0, linewidth=2)
-                        ax2.plot(avg_data['Month Start (UTC)'], avg_data['Monthly Average'], label="Average PM2.5",
-                                 color=group_color_shades[selected_group]["pm2.5"], alpha=1.0, linewidth=2)
-                    else:
-                        # Plot average on single subplot
-                        ax2.plot(avg_data['Month Start (UTC)'], avg_data['Monthly Average'], label="Average PM2.5",
-                                 color=group_color_shades[selected_group]["pm2.5"], alpha=1.0, linewidth=2)
-                else:
-                    # Plot O₃ average on the lower subplot's secondary y-axis
-                    ax2_twin.plot(avg_data['Month Start (UTC)'], avg_data['Monthly Average'], label="Average O₃",
-                                  color=group_color_shades[selected_group]["o₃"], alpha=1.0, linewidth=2)
-
-        # Add wildfire season shading
-        years = trend_data['Month Start (UTC)'].dt.year.unique()
-        for year in years:
-            if year != 2025:
-                start_date = pd.Timestamp(year=year, month=5, day=1)
-                end_date = pd.Timestamp(year=year, month=9, day=30)
-                if selected_group != "Pollutant Opposition Zones":
-                    ax1.axvspan(start_date, end_date, facecolor='orange', alpha=0.2)
-                    ax2.axvspan(start_date, end_date, facecolor='orange', alpha=0.2)
-                else:
-                    ax2.axvspan(start_date, end_date, facecolor='orange', alpha=0.2)
-
-        # Set y-axis limits based on the selected group
-        if selected_group == "Pollutant Synergy Zones":
-            ax1.set_ylim(10, 75)
-            ax2.set_ylim(0, 10)
-        elif selected_group == "Moderate Alignment Areas":
-            ax1.set_ylim(10, 55)
-            ax2.set_ylim(0, 10)
-        elif selected_group == "Mild Divergence Zones":
-            ax1.set_ylim(10, 50)
-            ax2.set_ylim(0, 10)
-        elif selected_group == "Pollutant Opposition Zones":
-            ax2.set_ylim(0, 20)  # Single axis for this group
-
-        # Configure broken axis for groups with two subplots
-        if selected_group != "Pollutant Opposition Zones":
-            # Hide the spines between the subplots to create the broken axis effect
-            ax1.spines['bottom'].set_visible(False)
-            ax2.spines['top'].set_visible(False)
-
-            # Adjust ticks
-            ax1.xaxis.tick_top()
-            ax1.tick_params(labeltop=False)
-            ax2.xaxis.tick_bottom()
-
-            # Add diagonal lines to indicate the break
-            d = 0.015  # Size of the diagonal lines
-            kwargs = dict(transform=ax1.transAxes, color='k', clip_on=False)
-            ax1.plot((-d, +d), (-d, +d), **kwargs)  # Top-left diagonal
-            ax1.plot((1 - d, 1 + d), (-d, +d), **kwargs)  # Top-right diagonal
-            kwargs.update(transform=ax2.transAxes)
-            ax2.plot((-d, +d), (1 - d, 1 + d), **kwargs)  # Bottom-left diagonal
-            ax2.plot((1 - d, 1 + d), (1 - d, 1 + d), **kwargs)  # Bottom-right diagonal
-
-        # Set labels and titles
-        if selected_group != "Pollutant Opposition Zones":
-            ax1.set_ylabel("PM2.5 (µg/m³)")
-            ax2.set_ylabel("PM2.5 (µg/m³)")
-        else:
-            ax2.set_ylabel("PM2.5 (µg/m³)")
-        ax2_twin.set_ylabel("O₃ (ppm)")
-        ax2.set_xlabel("Year")
-        fig.suptitle(f"Monthly {', '.join(selected_pollutants_display)} Averages", fontsize=16)
+                # Plot O₃ average on the lower subplot's secondary y-axis
+                ax2_twin.plot(avg_data['Period Start (UTC)'], avg_data['Mean'], label="Average O₃",
+                              color=group_color_shades[selected_group]["o₃"], alpha=1.0, linewidth=2)
+
+    # Add wildfire season shading as a single PolyCollection per axis (x in data units, y spanning the axis)
+    years = trend_data['Period Start (UTC)'].dt.year.unique()
+    years = np.sort(years[years != 2025])
+    season_starts = mdates.date2num(np.array([f"{year}-05-01" for year in years], dtype='datetime64[ns]'))
+    season_ends = mdates.date2num(np.array([f"{year}-09-30" for year in years], dtype='datetime64[ns]'))
+    season_boxes = [[(x0, 0), (x0, 1), (x1, 1), (x1, 0)] for x0, x1 in zip(season_starts, season_ends)]
+    for shade_ax in ([ax2] if ax1 is None else [ax1, ax2]):
+        shade_ax.add_collection(PolyCollection(season_boxes, transform=shade_ax.get_xaxis_transform(),
+                                               facecolors='orange', edgecolors='none', alpha=0.2), autolim=False)
+
+    # Set y-axis limits based on the selected group
+    if selected_group == "Pollutant Synergy Zones":
+        ax1.set_ylim(10, 75)
+        ax2.set_ylim(0, 10)
+    elif selected_group == "Moderate Alignment Areas":
+        ax1.set_ylim(10, 55)
+        ax2.set_ylim(0, 10)
+    elif selected_group == "Mild Divergence Zones":
+        ax1.set_ylim(10, 50)
+        ax2.set_ylim(0, 10)
+    elif selected_group == "Pollutant Opposition Zones":
+        ax2.set_ylim(0, 20)  # Single axis for this group
+
+    # Configure broken axis for groups with two subplots
+    if selected_group != "Pollutant Opposition Zones":
+        # Hide the spines between the subplots to create the broken axis effect
+        ax1.spines['bottom'].set_visible(False)
+        ax2.spines['top'].set_visible(False)
+
+        # Adjust ticks
+        ax1.xaxis.tick_top()
+        ax1.tick_params(labeltop=False)
+        ax2.xaxis.tick_bottom()
+
+        # Add diagonal lines to indicate the break
+        d = 0.015  # Size of the diagonal lines
+        kwargs = dict(transform=ax1.transAxes, color='k', clip_on=False)
+        ax1.plot((-d, +d), (-d, +d), **kwargs)  # Top-left diagonal
+        ax1.plot((1 - d, 1 + d), (-d, +d), **kwargs)  # Top-right diagonal
+        kwargs.update(transform=ax2.transAxes)
+        ax2.plot((-d, +d), (1 - d, 1 + d), **kwargs)  # Bottom-left diagonal
+        ax2.plot((1 - d, 1 + d), (1 - d, 1 + d), **kwargs)  # Bottom-right diagonal
+
+    # Set labels and titles
+    if selected_group != "Pollutant Opposition Zones":
+        ax1.set_ylabel("PM2.5 (µg/m³)")
+        ax2.set_ylabel("PM2.5 (µg/m³)")
+    else:
+        ax2.set_ylabel("PM2.5 (µg/m³)")
+    ax2_twin.set_ylabel("O₃ (ppm)")
+    ax2.set_xlabel("Year")
+    fig.suptitle(f"{resolution_titles[resolution]} {', '.join(selected_pollutants_display)} Averages ({start_year}-{end_year})", fontsize=16)
 
-        # Adjust x-axis ticks to show years
-        years = trend_data['Month Start (UTC)'].dt.year.unique()
-        ax2.set_xticks([pd.Timestamp(year=year, month=1, day=1) for year in years])
-        ax2.set_xticklabels([str(year) for year in years])
+    # Adjust x-axis ticks to show years
+    years = trend_data['Period Start (UTC)'].dt.year.unique()
+    ax2.set_xticks([pd.Timestamp(year=year, month=1, day=1) for year in years])
+    ax2.set_xticklabels([str(year) for year in years])
 
-        # Display the plot in Streamlit
-        st.pyplot(fig)
+    buf = io.BytesIO()
+    fig.savefig(buf, format='png', bbox_inches='tight')
+    plt.close(fig)
+    return buf.getvalue()
+
+# Row 2: Plot and Insights side-by-side
+col_plot, col_insight = st.columns([4, 1])
+with col_plot:
+    # Trend figures depend only on the data version and the filters, so replicas share them
+    trend_key = cache_key(data_version, "trend", selected_group, start_year, end_year, resolution, *selected_pollutants_api)
+    trend_png = shared_cache.get(trend_key)
+    if trend_png is None:
+        trend_png = render_trend_chart(window_rollup(rollups, resolution, start_year, end_year), selected_group, selected_pollutants_api, selected_pollutants_display,
+                                       selected_cities, start_year, end_year, resolution,
+                                       show_range=resolution != next(iter(rollups)))
+        if trend_png is not None:
+            shared_cache.set(trend_key, trend_png)
+    if trend_png is not None:
+        st.image(trend_png, use_container_width=True)
 
 with col_insight:
     st.subheader("Insights")
@@ -386,7 +560,21 @@ table_data = {
     "Correlation": [location_groups[selected_group]["correlations"][city] for city in location_groups[selected_group]["cities"] if city in selected_cities],
     "Characteristics": [location_groups[selected_group]["characteristics"][city] for city in location_groups[selected_group]["cities"] if city in selected_cities]
 }
-st.table(pd.DataFrame(table_data))
+table_df = pd.DataFrame(table_data)
+
+# Per-city correlations recomputed on the current data by analytics.py, when available
+city_corrs = shared_cache.get_frame(cache_key(data_version, "analytics", "city_correlations"))
+if city_corrs is not None:
+    season_corrs = city_corrs[city_corrs['Period'] == "Wildfire Season"].set_index('City')['Correlation']
+    table_df["Wildfire Season Correlation (Current Data)"] = table_df["City"].map(season_corrs).round(3)
+st.table(table_df)
+
+# Category correlations from the analytics pipeline
+category_corrs = shared_cache.get_frame(cache_key(data_version, "analytics", "category_correlations"))
+if category_corrs is not None:
+    with st.expander("Correlations by City Category"):
+        st.dataframe(category_corrs.pivot_table(index=['Categorization', 'Category'], columns='Period', values='Correlation'),
+                     use_container_width=True)
 
 # Sample size validation note
 if excluded_cities:
@@ -394,6 +582,36 @@ if excluded_cities:
 else:
     st.info("All selected cities have sufficient data (>=10 months).")
 
+# Row 4: Export the rows behind the current selection
+st.subheader("Export Data")
+col_export1, col_export2, col_export3 = st.columns(3)
+with col_export1:
+    export_season_only = st.checkbox("Wildfire season months only (May-Sep)")
+with col_export2:
+    export_format = st.radio("Format", list(EXPORT_FORMATS.keys()), horizontal=True)
+with col_export3:
+    # Exports are streamed in chunks from the mapped store to a file shared by every session
+    # asking for the same selection, and served from disk by the static file server rather
+    # than being read into each session's memory
+    if st.button("Prepare Export"):
+        export_fmt = EXPORT_FORMATS[export_format]
+        export_indices = dataset.select(
+            cities=selected_cities or None,
+            pollutants=selected_pollutants_api,
+            years=range(start_year, end_year + 1),
+            months=[5, 6, 7, 8, 9] if export_season_only else None
+        )
+        path = export_to_file(dataset, export_indices,
+                              export_path(data_version, export_fmt, selected_group, start_year, end_year,
+                                          export_season_only, *selected_pollutants_api),
+                              export_fmt)
+        prune_exports(data_version)
+        file_name = f"air_quality_{selected_group.lower().replace(' ', '_')}_{start_year}-{end_year}.{export_fmt}"
+        st.markdown(
+            f'<a href="{export_url(path)}" download="{file_name}">Download {len(export_indices)} rows</a>',
+            unsafe_allow_html=True
+        )
+
 # Heatmap Section
 st.header("Wildfire Season Heatmap (May-Sep)")
 
@@ -401,23 +619,42 @@ st.header("Wildfire Season Heatmap (May-Sep)")
 col1, col2 = st.columns([1.5, 3.5])
 with col1:
     st.subheader("Select Wildfire Season")
-    unique_years = sorted(df['Month Start (UTC)'].dt.year.unique())
+    unique_years = sorted(np.unique(dataset.year))
     wildfire_seasons = [f"{year} (May-Sep)" for year in unique_years if year >= 2018 and year <= 2024]
     selected_season = st.radio("Choose Season", wildfire_seasons, index=len(wildfire_seasons)-1)
 
+    # Period within the season; whole-season maps are pregenerated, single months are rendered on demand
+    season_periods = {"Whole Season": [5, 6, 7, 8, 9], "May": [5], "Jun": [6], "Jul": [7], "Aug": [8], "Sep": [9]}
+    selected_period = st.selectbox("Choose Period", list(season_periods.keys()))
+
 with col2:
     if selected_season:
-        st.subheader(f"Static Geographic Heatmap for PM2.5 and O₃ - {selected_season}")
-        st.image(preloaded_maps[selected_season], use_container_width=True)
+        if selected_period == "Whole Season":
+            period_label = selected_season
+            map_key = preloaded_maps[selected_season]
+        else:
+            period_label = f"{selected_period} {selected_season.split(' ')[0]}"
+            map_key = cache_key(data_version, "maps", selected_season, selected_period)
+            if not shared_cache.contains(map_key):
+                shared_cache.set(map_key, render_season_map(dataset, selected_season, season_periods[selected_period], period_label))
+        st.subheader(f"Static Geographic Heatmap for PM2.5 and O₃ - {period_label}")
+        st.image(shared_cache.get(map_key), use_container_width=True)
 
 # Row 2: Aggregate Table
-if selected_season:
+def season_aggregates(dataset, selected_season, months, period_label):
     year = int(selected_season.split(" ")[0])
-    season_df = df[
-        (df['Month Start (UTC)'].dt.year == year) &
-        (df['Month Start (UTC)'].dt.month.isin([5, 6, 7, 8, 9]))
-    ].copy()
-    st.subheader("Aggregated Air Quality Data for Selected Wildfire Season")
+    season_df = dataset.frame(
+        dataset.select(years=[year], months=months),
+        ['City', 'Sensor Parameter', 'Unit', 'Monthly Average']
+    )
     agg_data = season_df.groupby(['City', 'Sensor Parameter', 'Unit'])[['Monthly Average']].mean().reset_index()
-    agg_data['Season'] = selected_season
+    agg_data['Season'] = period_label
+    return agg_data
+
+if selected_season:
+    st.subheader("Aggregated Air Quality Data for Selected Wildfire Season")
+    agg_data = shared_cache.get_or_create_frame(
+        cache_key(data_version, "aggregates", selected_season, selected_period),
+        lambda: season_aggregates(dataset, selected_season, season_periods[selected_period], period_label)
+    )
     st.write(agg_data[['City', 'Sensor Parameter', 'Unit', 'Monthly Average', 'Season']], use_container_width=True)
\ No newline at end of file
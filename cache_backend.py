@@ -0,0 +1,173 @@
+import hashlib
+import io
+import os
+import re
+import shutil
+import tempfile
+from abc import ABC, abstractmethod
+
+import pandas as pd
+
+# Default location of the shared cache; point every replica at the same volume
+DEFAULT_CACHE_DIR = os.environ.get("AQ_CACHE_DIR", ".cache")
+
+# First key segment of version-namespaced entries (see cache_key); other keys are never pruned
+VERSION_PATTERN = re.compile(r"^[0-9a-f]{16}$")
+
+
+class CacheBackend(ABC):
+    """Byte-oriented key/value store shared by every dashboard replica.
+
+    Backends implement get, set and prune; a backend missing any of them fails when it
+    is instantiated rather than on first use.
+    """
+
+    @abstractmethod
+    def get(self, key):
+        """Return the bytes stored under key, or None."""
+
+    @abstractmethod
+    def set(self, key, value):
+        """Store value (bytes) under key."""
+
+    def contains(self, key):
+        return self.get(key) is not None
+
+    @abstractmethod
+    def prune(self, keep_versions):
+        """Delete every entry namespaced by a data version not in keep_versions."""
+
+    def get_or_create(self, key, factory):
+        """Return the cached bytes for key, calling factory() to produce them on a miss."""
+        value = self.get(key)
+        if value is None:
+            value = factory()
+            self.set(key, value)
+        return value
+
+    def get_frame(self, key):
+        value = self.get(key)
+        return None if value is None else frame_from_bytes(value)
+
+    def set_frame(self, key, df):
+        self.set(key, frame_to_bytes(df))
+
+    def get_or_create_frame(self, key, factory):
+        """Return the cached DataFrame for key, calling factory() to build it on a miss."""
+        df = self.get_frame(key)
+        if df is None:
+            df = factory()
+            self.set_frame(key, df)
+        return df
+
+
+class FileSystemCache(CacheBackend):
+    """Cache stored as one file per key under a directory (local disk or a shared volume)."""
+
+    def __init__(self, root=DEFAULT_CACHE_DIR):
+        self.root = os.path.abspath(root)
+        os.makedirs(self.root, exist_ok=True)
+
+    def path(self, key):
+        # Keys are '/'-separated; anything else outside a safe set is replaced
+        parts = [re.sub(r"[^A-Za-z0-9._-]", "_", part) for part in key.split("/") if part not in ("", ".", "..")]
+        return os.path.join(self.root, *parts)
+
+    def get(self, key):
+        try:
+            with open(self.path(key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def set(self, key, value):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temp file and rename so concurrent replicas never read a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(value)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def contains(self, key):
+        return os.path.exists(self.path(key))
+
+    def prune(self, keep_versions):
+        prune_version_dirs(self.root, keep_versions)
+
+
+class RedisCache(CacheBackend):
+    """Cache stored in Redis (or any server speaking its protocol)."""
+
+    def __init__(self, url, prefix="aq:"):
+        try:
+            import redis
+        except ImportError as e:
+            raise ImportError("RedisCache requires the 'redis' package (pip install redis)") from e
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key):
+        return self.client.get(self.prefix + key)
+
+    def set(self, key, value):
+        self.client.set(self.prefix + key, value)
+
+    def contains(self, key):
+        return bool(self.client.exists(self.prefix + key))
+
+    def prune(self, keep_versions):
+        stale = []
+        for raw_key in self.client.scan_iter(match=self.prefix + "*", count=1000):
+            version = raw_key.decode()[len(self.prefix):].split("/", 1)[0]
+            if VERSION_PATTERN.match(version) and version not in keep_versions:
+                stale.append(raw_key)
+        for start in range(0, len(stale), 500):
+            self.client.delete(*stale[start:start + 500])
+
+
+def prune_version_dirs(root, keep_versions):
+    """Remove the <root>/<data_version>/ directories of versions not in keep_versions."""
+    if not os.path.isdir(root):
+        return
+    for name in os.listdir(root):
+        if VERSION_PATTERN.match(name) and name not in keep_versions:
+            shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+
+
+def prune_versions(cache, keep_versions, cache_dir=DEFAULT_CACHE_DIR):
+    """Evict old data versions from the shared cache and the local Arrow store directory."""
+    keep_versions = set(keep_versions)
+    cache.prune(keep_versions)
+    # The memory-mapped stores live under cache_dir even when the shared cache is Redis
+    prune_version_dirs(cache_dir, keep_versions)
+
+
+def get_cache_backend():
+    """Build the backend named by AQ_CACHE_URL (redis://...) or fall back to AQ_CACHE_DIR."""
+    url = os.environ.get("AQ_CACHE_URL", "")
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisCache(url)
+    return FileSystemCache(DEFAULT_CACHE_DIR)
+
+
+def cache_key(data_version, kind, *parts):
+    """Build a key namespaced by data version, e.g. '<version>/maps/2021.png'."""
+    name = "_".join(str(p) for p in parts)
+    if len(name) > 80:
+        name = hashlib.sha256(name.encode("utf-8")).hexdigest()[:32]
+    return f"{data_version}/{kind}/{name}"
+
+
+def frame_to_bytes(df):
+    buf = io.BytesIO()
+    df.to_parquet(buf, index=False)
+    return buf.getvalue()
+
+
+def frame_from_bytes(value):
+    return pd.read_parquet(io.BytesIO(value))
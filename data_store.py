@@ -0,0 +1,243 @@
+import hashlib
+import io
+import json
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.feather as feather
+
+from cache_backend import DEFAULT_CACHE_DIR
+
+# Path of the monthly aggregate dataset written by csv_script.ipynb
+DATA_PATH = "air_quality_monthly_data.csv"
+
+# Column types of the clean store written by validation.py
+STRING_COLUMNS = ['City', 'Sensor Parameter', 'Unit']
+TIMESTAMP_COLUMNS = ['Month Start (UTC)', 'Month End (UTC)']
+MEASUREMENT_COLUMNS = ['Monthly Average', 'Minimum Value', 'Maximum Value', 'Median Value', 'Standard Deviation']
+NUMERIC_COLUMNS = ['Latitude', 'Longitude'] + MEASUREMENT_COLUMNS
+# Derived column holding 'Month Start (UTC)' normalized to 00:00 UTC. The source timestamps
+# carry local-midnight offsets (03:00-08:00 UTC), so filters, rollups and dedupe use this.
+MONTH_COLUMN = 'Month (UTC)'
+COLUMN_DTYPES = {
+    **{name: "string" for name in STRING_COLUMNS},
+    **{name: "float64" for name in NUMERIC_COLUMNS},
+    'Quality Flags': "uint8",
+}
+
+# Hashes are memoized on (path, size, mtime) so a rerun only pays for an os.stat
+_version_memo = {}
+
+
+def build_manifest(path=DATA_PATH):
+    """Return a content manifest (size, row count and SHA-256) for the dataset file."""
+    digest = hashlib.sha256()
+    size = 0
+    rows = 0
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+            size += len(chunk)
+            rows += chunk.count(b"\n")
+    return {
+        "path": os.path.basename(path),
+        "size": size,
+        "rows": max(rows - 1, 0),  # Exclude the header line
+        "sha256": digest.hexdigest(),
+    }
+
+
+def get_data_version(path=DATA_PATH):
+    """Return a short content hash identifying the current version of the dataset."""
+    stat = os.stat(path)
+    memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    version = _version_memo.get(memo_key)
+    if version is None:
+        version = build_manifest(path)["sha256"][:16]
+        _version_memo.clear()  # Only the latest file state is worth remembering
+        _version_memo[memo_key] = version
+    return version
+
+
+class DataVersionChanged(RuntimeError):
+    """The dataset file was replaced between hashing it and reading its rows."""
+
+
+def read_snapshot(path=DATA_PATH):
+    """Read the dataset file once and return (data_version, content) for exactly those bytes."""
+    with open(path, "rb") as f:
+        content = f.read()
+    return hashlib.sha256(content).hexdigest()[:16], content
+
+
+def normalize_month(month_start):
+    """Normalize tz-aware month start timestamps to 00:00 UTC on the same day."""
+    return month_start.dt.tz_convert('UTC').dt.normalize()
+
+
+def load_dataset(path=DATA_PATH, data_version=None):
+    """Load the dataset through the validation stage, adding the normalized MONTH_COLUMN.
+
+    Called once per data version (when the Arrow store is built, or by the analytics
+    pipeline), so the CSV on disk need not have been validated already. The rows are
+    parsed from the same bytes that are hashed; if data_version is given and those bytes
+    no longer match it, DataVersionChanged is raised instead of storing them under it.
+    """
+    from validation import read_raw, validate  # validation imports this module
+
+    snapshot_version, content = read_snapshot(path)
+    if data_version is not None and snapshot_version != data_version:
+        raise DataVersionChanged(f"{path} changed from version {data_version} to {snapshot_version}")
+    df, _ = validate(read_raw(io.BytesIO(content)))
+    return df.astype({name: dtype for name, dtype in COLUMN_DTYPES.items() if name in df.columns})
+
+
+def publish_dataset(df, path=DATA_PATH):
+    """Atomically replace the dataset file so readers never observe a partial write."""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", newline="", encoding="utf-8") as f:
+            df.to_csv(f, index=False)
+        os.replace(tmp_path, path)  # Atomic on POSIX and Windows
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+    # Write the manifest next to the data so other tools can check which version they read
+    manifest = build_manifest(path)
+    with open(f"{path}.manifest.json", "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest["sha256"][:16]
+
+
+# Columns stored dictionary-encoded in the Arrow store; filters compare integer codes
+CATEGORY_COLUMNS = STRING_COLUMNS
+
+
+def dataset_path(data_version, cache_dir=None):
+    """Return the path of the Arrow IPC (Feather v2) store for a data version."""
+    return os.path.join(cache_dir or DEFAULT_CACHE_DIR, data_version, "dataset.arrow")
+
+
+def write_arrow_store(df, path):
+    """Write df as a single-chunk, uncompressed Arrow IPC file so it can be memory-mapped."""
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    for name in CATEGORY_COLUMNS:
+        if name in table.column_names:
+            index = table.column_names.index(name)
+            table = table.set_column(index, name, table.column(name).dictionary_encode())
+    table = table.unify_dictionaries().combine_chunks()
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    os.close(fd)
+    try:
+        feather.write_feather(table, tmp_path, compression="uncompressed", chunksize=max(len(table), 1))
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+class SharedDataset:
+    """Read-only view of the dataset backed by a memory-mapped Arrow file.
+
+    Every process maps the same file, so the OS page cache holds one copy no matter
+    how many sessions or replicas read it. Filters return index arrays and only the
+    selected rows are materialized as a pandas DataFrame.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        # The mapping stays open for the lifetime of the dataset; the table's buffers point into it
+        self._source = pa.memory_map(path, "r")
+        self.table = pa.ipc.open_file(self._source).read_all()
+
+        # Zero-copy numpy views over the mapped buffers. validate() drops rows without a month,
+        # so a null here means the store was not built through load_dataset.
+        month_start = self.table.column(MONTH_COLUMN).chunk(0)
+        if month_start.null_count:
+            raise ValueError(f"{path}: {month_start.null_count} rows have no '{MONTH_COLUMN}'; "
+                             "rebuild the store from validated data")
+        self.month_start = month_start.to_numpy().astype('datetime64[ns]', copy=False)
+        # Null categories (e.g. a missing unit) get code -1, which matches no filter value
+        self._codes = {name: self._category_codes(name) for name in CATEGORY_COLUMNS}
+        self._categories = {name: self.table.column(name).chunk(0).dictionary.to_pylist() for name in CATEGORY_COLUMNS}
+
+        # Small derived calendar arrays, computed once per process
+        self.year = (self.month_start.astype('datetime64[Y]').astype(np.int64) + 1970).astype(np.int16)
+        self.month = (self.month_start.astype('datetime64[M]').astype(np.int64) % 12 + 1).astype(np.int8)
+
+    def _category_codes(self, name):
+        indices = self.table.column(name).chunk(0).indices
+        if indices.null_count:
+            indices = pc.fill_null(indices, -1)  # Copies, but only for columns with nulls
+        return indices.to_numpy()
+
+    def __len__(self):
+        return self.table.num_rows
+
+    def categories(self, name):
+        return self._categories[name]
+
+    def codes(self, name):
+        return self._codes[name]
+
+    def values(self, name):
+        """Return a numpy view of a numeric column (copied only if it contains nulls)."""
+        return self.table.column(name).chunk(0).to_numpy(zero_copy_only=False)
+
+    def _isin(self, name, values):
+        values = set(values)
+        wanted = [i for i, value in enumerate(self._categories[name]) if value in values]
+        return np.isin(self._codes[name], wanted)
+
+    def select(self, cities=None, pollutants=None, years=None, months=None, start=None, end=None):
+        """Return the row indices matching every given filter (None means no filter)."""
+        mask = np.ones(len(self), dtype=bool)
+        if cities is not None:
+            mask &= self._isin('City', cities)
+        if pollutants is not None:
+            mask &= self._isin('Sensor Parameter', pollutants)
+        if years is not None:
+            mask &= np.isin(self.year, list(years))
+        if months is not None:
+            mask &= np.isin(self.month, list(months))
+        if start is not None:
+            mask &= self.month_start >= np.datetime64(pd.Timestamp(start).tz_localize(None), 'ns')
+        if end is not None:
+            mask &= self.month_start <= np.datetime64(pd.Timestamp(end).tz_localize(None), 'ns')
+        return np.flatnonzero(mask)
+
+    def frame(self, indices=None, columns=None):
+        """Materialize the given rows and columns as a pandas DataFrame."""
+        return self.take(indices, columns).to_pandas()
+
+    def take(self, indices=None, columns=None):
+        """Return the given rows and columns as an Arrow table with plain string columns."""
+        table = self.table if columns is None else self.table.select(columns)
+        if indices is not None:
+            table = table.take(pa.array(indices, type=pa.int64()))
+        return decode_categories(table)
+
+
+def decode_categories(table):
+    """Decode dictionary columns so callers see plain strings rather than Categoricals."""
+    for name in CATEGORY_COLUMNS:
+        if name in table.column_names:
+            index = table.column_names.index(name)
+            table = table.set_column(index, name, table.column(name).cast(pa.string()))
+    return table
+
+
+def open_shared_dataset(data_version, path=DATA_PATH, cache_dir=None):
+    """Open the memory-mapped store for data_version, converting the CSV on first use."""
+    store_path = dataset_path(data_version, cache_dir)
+    if not os.path.exists(store_path):
+        write_arrow_store(load_dataset(path, data_version), store_path)
+    return SharedDataset(store_path)
@@ -0,0 +1,152 @@
+import argparse
+import io
+import os
+import sys
+import tempfile
+from urllib.parse import quote
+
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+
+from cache_backend import cache_key
+from data_store import DATA_PATH, MONTH_COLUMN, TIMESTAMP_COLUMNS, get_data_version, open_shared_dataset
+
+# Rows materialized at a time; memory use is bounded by this regardless of the selection size
+EXPORT_CHUNK_ROWS = 50_000
+EXPORT_FORMATS = {"CSV": "csv", "Parquet": "parquet"}
+
+# Finished exports are served by Streamlit's static file server (server.enableStaticServing),
+# which maps <app dir>/static/ to the app/static/ URL path. With several replicas behind a
+# load balancer, mount the shared cache volume at this directory in every replica so a
+# download link works whichever replica serves it.
+EXPORT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "exports")
+EXPORT_URL = "app/static/exports"
+# Newest export files kept per data version
+MAX_EXPORT_FILES = 50
+
+# Timestamps in CSV exports are written the way publish_dataset (pandas) writes them
+CSV_TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S+00:00"
+
+
+def export_columns(dataset):
+    """Return the columns written to exports: the published CSV's, without the derived month."""
+    return [name for name in dataset.table.column_names if name != MONTH_COLUMN]
+
+
+def iter_chunks(dataset, indices, columns=None, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Yield the selected rows as Arrow tables of at most chunk_rows rows."""
+    columns = columns or export_columns(dataset)
+    for start in range(0, len(indices), chunk_rows):
+        yield dataset.take(indices[start:start + chunk_rows], columns)
+
+
+def _csv_bytes(table, include_header):
+    """Encode a table as CSV in the published file's style (UTC offsets, minimal quoting)."""
+    for name in TIMESTAMP_COLUMNS:
+        if name in table.column_names:
+            index = table.column_names.index(name)
+            # Stored timestamps are UTC, so the offset is always +00:00
+            table = table.set_column(index, name, pc.strftime(table.column(name), format=CSV_TIMESTAMP_FORMAT))
+    buf = io.BytesIO()
+    pa_csv.write_csv(table, buf, pa_csv.WriteOptions(include_header=include_header, quoting_style="needed"))
+    return buf.getvalue()
+
+
+def iter_csv(dataset, indices, columns=None, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Yield the selected rows as CSV-encoded bytes, one chunk at a time."""
+    columns = columns or export_columns(dataset)
+    for i, chunk in enumerate(iter_chunks(dataset, indices, columns, chunk_rows)):
+        yield _csv_bytes(chunk, include_header=i == 0)
+    if len(indices) == 0:
+        # Still emit a header for an empty selection
+        yield _csv_bytes(dataset.take([], columns), include_header=True)
+
+
+def write_export(dataset, indices, sink, fmt="csv", columns=None, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Stream the selected rows to a binary file-like sink as CSV or Parquet."""
+    columns = columns or export_columns(dataset)
+    if fmt == "csv":
+        for data in iter_csv(dataset, indices, columns, chunk_rows):
+            sink.write(data)
+    elif fmt == "parquet":
+        with pq.ParquetWriter(sink, dataset.take([], columns).schema) as writer:
+            for chunk in iter_chunks(dataset, indices, columns, chunk_rows):
+                writer.write_table(chunk)
+    else:
+        raise ValueError(f"Unknown export format: {fmt}")
+
+
+def export_path(data_version, fmt, *selection):
+    """Return the file under EXPORT_DIR an export of this selection is written to."""
+    return os.path.join(EXPORT_DIR, cache_key(data_version, fmt, *selection) + f".{fmt}")
+
+
+def export_url(path):
+    """Return the URL the static file server serves an export file under."""
+    relative = os.path.relpath(path, EXPORT_DIR).replace(os.sep, "/")
+    return f"{EXPORT_URL}/{quote(relative)}"
+
+
+def export_to_file(dataset, indices, path, fmt="csv"):
+    """Write an export to path atomically, reusing an existing file for the same selection."""
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                write_export(dataset, indices, f, fmt)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+    else:
+        os.utime(path)  # Reuse counts as recent use when pruning
+    return path
+
+
+def prune_exports(data_version, max_files=MAX_EXPORT_FILES):
+    """Delete all but the newest max_files exports of a data version.
+
+    Exports of old versions are removed with the rest of the version's artifacts
+    (see cache_backend.prune_versions), so replicas still serving the previous
+    version keep their links working.
+    """
+    files = []
+    for root, _, names in os.walk(os.path.join(EXPORT_DIR, data_version)):
+        files.extend(os.path.join(root, name) for name in names if not name.endswith(".tmp"))
+    files.sort(key=lambda f: os.path.getmtime(f), reverse=True)
+    for stale in files[max_files:]:
+        try:
+            os.remove(stale)
+        except FileNotFoundError:
+            pass  # Another session pruned it first
+
+
+if __name__ == "__main__":
+    # Stream a filtered export to stdout (or --output), e.g.
+    #   python export.py --pollutant pm2.5 --start-year 2021 --end-year 2023 --season-only > pm25.csv
+    #   python export.py --city Saskatoon --format parquet --output saskatoon.parquet
+    parser = argparse.ArgumentParser(description="Export filtered rows of the air quality dataset.")
+    parser.add_argument("--city", action="append", help="City to include (repeatable; default all)")
+    parser.add_argument("--pollutant", action="append", help="Pollutant to include (repeatable; default all)")
+    parser.add_argument("--start-year", type=int, help="First year to include")
+    parser.add_argument("--end-year", type=int, help="Last year to include")
+    parser.add_argument("--season-only", action="store_true", help="Only include wildfire season months (May-Sep)")
+    parser.add_argument("--format", choices=sorted(EXPORT_FORMATS.values()), default="csv")
+    parser.add_argument("--output", help="File to write (default stdout; required for Parquet)")
+    args = parser.parse_args()
+    if args.format == "parquet" and not args.output:
+        parser.error("--output is required for Parquet exports")
+
+    dataset = open_shared_dataset(get_data_version(DATA_PATH), DATA_PATH)
+    years = None
+    if args.start_year is not None or args.end_year is not None:
+        years = range(args.start_year or int(dataset.year.min()), (args.end_year or int(dataset.year.max())) + 1)
+    indices = dataset.select(cities=args.city, pollutants=args.pollutant, years=years,
+                             months=[5, 6, 7, 8, 9] if args.season_only else None)
+    if args.output:
+        with open(args.output, "wb") as f:
+            write_export(dataset, indices, f, args.format)
+    else:
+        write_export(dataset, indices, sys.stdout.buffer, args.format)
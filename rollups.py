@@ -0,0 +1,139 @@
+import numpy as np
+import pandas as pd
+
+# Resolutions from finest to coarsest. "Season" splits each year into the wildfire
+# season (May-Sep) and the off-season (Oct-Apr, labelled by its October start).
+RESOLUTIONS = ["Hour", "Day", "Month", "Season", "Year"]
+
+# Aggregates kept at every level; Sum and Count let coarser levels be combined exactly
+ROLLUP_COLUMNS = ['City', 'Sensor Parameter', 'Period Start (UTC)', 'Mean', 'Min', 'Max', 'Sum', 'Count']
+
+
+def base_resolution(timestamps):
+    """Return the finest resolution present in an array of datetime64[ns] timestamps."""
+    ts = np.asarray(timestamps, dtype='datetime64[ns]')
+    if (ts != ts.astype('datetime64[D]')).any():
+        return "Hour"
+    if (ts.astype('datetime64[D]') != ts.astype('datetime64[M]')).any():
+        return "Day"
+    return "Month"
+
+
+def available_resolutions(timestamps):
+    """Return the resolutions that can be served for data sampled at the given timestamps."""
+    return RESOLUTIONS[RESOLUTIONS.index(base_resolution(timestamps)):]
+
+
+def bucket_start(timestamps, resolution):
+    """Map datetime64[ns] timestamps to the start of their bucket at the given resolution."""
+    ts = np.asarray(timestamps, dtype='datetime64[ns]')
+    if resolution == "Hour":
+        return ts.astype('datetime64[h]').astype('datetime64[ns]')
+    if resolution == "Day":
+        return ts.astype('datetime64[D]').astype('datetime64[ns]')
+    if resolution == "Month":
+        return ts.astype('datetime64[M]').astype('datetime64[ns]')
+    if resolution == "Year":
+        return ts.astype('datetime64[Y]').astype('datetime64[ns]')
+    if resolution == "Season":
+        months = ts.astype('datetime64[M]').astype(np.int64)  # Months since 1970-01
+        month_of_year = months % 12 + 1
+        # Wildfire season starts in May; the off-season starts in October (Jan-Apr belong to the previous October)
+        start_month = np.where(
+            (month_of_year >= 5) & (month_of_year <= 9), months - (month_of_year - 5),
+            np.where(month_of_year >= 10, months - (month_of_year - 10), months - (month_of_year + 2))
+        )
+        return start_month.astype('datetime64[M]').astype('datetime64[ns]')
+    raise ValueError(f"Unknown resolution: {resolution}")
+
+
+def _finish(rollup):
+    rollup['Mean'] = rollup['Sum'] / rollup['Count']
+    return rollup[rollup['Count'] > 0][ROLLUP_COLUMNS].sort_values(
+        ['City', 'Sensor Parameter', 'Period Start (UTC)']
+    ).reset_index(drop=True)
+
+
+def build_base_rollup(dataset, value_column='Monthly Average'):
+    """Aggregate the raw rows of a SharedDataset at their native resolution."""
+    resolution = base_resolution(dataset.month_start)
+    values = dataset.values(value_column).astype(float)
+    frame = pd.DataFrame({
+        'city': dataset.codes('City'),
+        'pollutant': dataset.codes('Sensor Parameter'),
+        'Period Start (UTC)': bucket_start(dataset.month_start, resolution),
+        'value': values,
+        'valid': ~np.isnan(values),
+    })
+    frame['value_or_zero'] = np.where(frame['valid'], frame['value'], 0.0)
+    rollup = frame.groupby(['city', 'pollutant', 'Period Start (UTC)'], sort=False).agg(
+        Min=('value', 'min'), Max=('value', 'max'), Sum=('value_or_zero', 'sum'), Count=('valid', 'sum')
+    ).reset_index()
+    rollup['City'] = np.asarray(dataset.categories('City'), dtype=object)[rollup['city']]
+    rollup['Sensor Parameter'] = np.asarray(dataset.categories('Sensor Parameter'), dtype=object)[rollup['pollutant']]
+    return _finish(rollup)
+
+
+def coarsen_rollup(rollup, resolution):
+    """Combine a finer rollup level into buckets at a coarser resolution."""
+    coarse = rollup.assign(**{'Period Start (UTC)': bucket_start(rollup['Period Start (UTC)'].to_numpy(), resolution)})
+    coarse = coarse.groupby(['City', 'Sensor Parameter', 'Period Start (UTC)'], sort=False).agg(
+        Min=('Min', 'min'), Max=('Max', 'max'), Sum=('Sum', 'sum'), Count=('Count', 'sum')
+    ).reset_index()
+    return _finish(coarse)
+
+
+def build_rollups(dataset):
+    """Build the min/max/mean/count pyramid for every resolution the data supports."""
+    levels = available_resolutions(dataset.month_start)
+    rollups = {levels[0]: build_base_rollup(dataset)}
+    for resolution in levels[1:]:
+        # Seasons cross calendar years, so every level is combined from the base level
+        rollups[resolution] = coarsen_rollup(rollups[levels[0]], resolution)
+    return rollups
+
+
+def window_rollup(rollups, resolution, start_year, end_year):
+    """Return one level of a pyramid restricted to rows from start_year through end_year.
+
+    Season buckets cross calendar years (Oct-Apr), so that level is re-coarsened from the
+    base level after filtering it; a bucket at a window edge then only aggregates rows inside
+    the window, and a leading off-season bucket is labelled with the window start.
+    """
+    if resolution != "Season":
+        rollup = rollups[resolution]
+        return rollup[rollup['Period Start (UTC)'].dt.year.between(start_year, end_year)]
+    base = next(iter(rollups.values()))  # build_rollups stores the base level first
+    window = coarsen_rollup(base[base['Period Start (UTC)'].dt.year.between(start_year, end_year)], resolution)
+    window['Period Start (UTC)'] = window['Period Start (UTC)'].clip(lower=pd.Timestamp(year=start_year, month=1, day=1))
+    return window
+
+
+def downsample_lttb(x, y, n_out):
+    """Return indices of at most n_out points chosen by Largest-Triangle-Three-Buckets.
+
+    LTTB keeps the points that contribute most to the visual shape of the line, so
+    isolated peaks such as wildfire spikes survive downsampling.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+
+    # First and last points are always kept; the rest is split into n_out - 2 buckets
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+        # Twice the area of the triangle (previous point, candidate, next bucket average)
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
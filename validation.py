@@ -0,0 +1,148 @@
+import json
+import sys
+
+import numpy as np
+import pandas as pd
+
+from data_store import (
+    DATA_PATH, MEASUREMENT_COLUMNS, MONTH_COLUMN, NUMERIC_COLUMNS, STRING_COLUMNS, TIMESTAMP_COLUMNS,
+    normalize_month, publish_dataset
+)
+
+# Units reported by the OpenAQ API for each pollutant, and plausible ranges in those units
+EXPECTED_UNITS = {"pm2.5": "µg/m³", "o₃": "ppm"}
+VALID_RANGES = {"pm2.5": (0.0, 1000.0), "o₃": (0.0, 0.5)}
+
+# Station names that arrived with broken encodings and cannot be repaired by normalization
+CITY_NAME_FIXES = {"R�s. Faun. Ashuapmus": "Rés. Faun. Ashuapmus"}
+
+# Bit flags stored in the 'Quality Flags' column
+FLAG_MISSING = 1
+FLAG_NEGATIVE = 2
+FLAG_OUT_OF_RANGE = 4
+FLAG_UNIT_MISMATCH = 8
+FLAG_INCONSISTENT = 16  # Average outside [minimum, maximum]
+FLAG_SUMMARY_MASKED = 32  # A negative minimum/median/maximum/sd was masked
+
+# Hourly summary fields checked column by column; an invalid one never masks the average.
+# Only negatives are masked: the plausible ranges apply to monthly averages, not hourly extremes.
+SUMMARY_COLUMNS = ['Minimum Value', 'Maximum Value', 'Median Value', 'Standard Deviation']
+
+# Columns a row cannot be stored or filtered without; rows missing any of them are dropped
+REQUIRED_COLUMNS = ['City', 'Sensor Parameter', 'Month Start (UTC)']
+
+# Row identity used for duplicate-month detection; the month is normalized because the
+# same month arrives with different UTC offsets (03:00-08:00) across fetches
+KEY_COLUMNS = ['City', 'Sensor Parameter', MONTH_COLUMN]
+
+
+def _normalize_text(series):
+    """NFC-normalize and strip a string column, applying known name fixes."""
+    series = series.astype("string").str.strip().str.normalize("NFC")
+    return series.replace(CITY_NAME_FIXES).astype("string")
+
+
+def validate(raw_df):
+    """Normalize raw fetcher output into typed columns and return (clean_df, report).
+
+    A negative or out-of-range 'Monthly Average' is replaced with NaN on its own; negative
+    summary fields (minimum, median, maximum, sd) are masked column by column. Rows
+    reported in the wrong unit are masked entirely. Every mask is recorded in 'Quality
+    Flags', so downstream readers can use the values as-is and still tell why one is missing.
+    Rows without a usable city, pollutant or month start are dropped and counted.
+    """
+    df = raw_df.copy()
+    report = {"rows_in": int(len(df))}
+
+    # Text columns: Unicode normalization and encoding fixes
+    fixed_names = df['City'].isin(list(CITY_NAME_FIXES)).sum()
+    for name in STRING_COLUMNS:
+        df[name] = _normalize_text(df[name])
+    df['Sensor Parameter'] = df['Sensor Parameter'].str.lower()
+    report["city_names_fixed"] = int(fixed_names)
+
+    # Numeric columns: "N/A" and other non-numeric placeholders become NaN
+    for name in NUMERIC_COLUMNS:
+        df[name] = pd.to_numeric(df[name], errors="coerce").astype("float64")
+    # ISO8601 accepts both the fetcher's '...T04:00:00Z' and the '... 04:00:00+00:00' that
+    # publish_dataset writes back; an inferred format would turn the other style into NaT
+    for name in TIMESTAMP_COLUMNS:
+        df[name] = pd.to_datetime(df[name], utc=True, errors="coerce", format="ISO8601")
+
+    unusable = df[REQUIRED_COLUMNS].isna().any(axis=1) | df['City'].eq("").fillna(False)
+    df = df[~unusable].reset_index(drop=True)
+    report["unusable_rows_dropped"] = int(unusable.sum())
+
+    flags = np.zeros(len(df), dtype=np.uint8)
+    missing = df['Monthly Average'].isna().to_numpy()
+    flags[missing] |= FLAG_MISSING
+
+    average = df['Monthly Average'].to_numpy()
+    negative = average < 0
+    flags[negative] |= FLAG_NEGATIVE
+
+    low = df['Sensor Parameter'].map({p: r[0] for p, r in VALID_RANGES.items()}).astype("float64").to_numpy()
+    high = df['Sensor Parameter'].map({p: r[1] for p, r in VALID_RANGES.items()}).astype("float64").to_numpy()
+    out_of_range = (average < low) | (average > high)
+    flags[out_of_range] |= FLAG_OUT_OF_RANGE
+
+    expected_unit = df['Sensor Parameter'].map(EXPECTED_UNITS)
+    unit_mismatch = (expected_unit.notna() & (df['Unit'] != expected_unit)).fillna(False).to_numpy(dtype=bool)
+    flags[unit_mismatch] |= FLAG_UNIT_MISMATCH
+
+    inconsistent = (average < df['Minimum Value'].to_numpy()) | (average > df['Maximum Value'].to_numpy())
+    flags[inconsistent] |= FLAG_INCONSISTENT
+
+    # Summary fields: each one is masked on its own
+    summary_masked = {}
+    for name in SUMMARY_COLUMNS:
+        invalid_column = df[name].to_numpy() < 0
+        df.loc[invalid_column, name] = np.nan
+        flags[invalid_column] |= FLAG_SUMMARY_MASKED
+        summary_masked[name] = int(invalid_column.sum())
+
+    # Unusable readings are masked rather than dropped so row counts per city stay visible
+    df.loc[negative | out_of_range, 'Monthly Average'] = np.nan
+    df.loc[unit_mismatch, MEASUREMENT_COLUMNS] = np.nan
+    df['Quality Flags'] = flags
+
+    # Duplicate months: keep the last fetched row for each city, pollutant and month
+    df[MONTH_COLUMN] = normalize_month(df['Month Start (UTC)'])
+    duplicated = df.duplicated(subset=KEY_COLUMNS, keep="last")
+    df = df[~duplicated].sort_values(KEY_COLUMNS, kind="stable").reset_index(drop=True)
+
+    report.update({
+        "rows_out": int(len(df)),
+        "duplicates_removed": int(duplicated.sum()),
+        "missing_average": int(missing.sum()),
+        "negative": int(negative.sum()),
+        "out_of_range": int(out_of_range.sum()),
+        "unit_mismatch": int(unit_mismatch.sum()),
+        "inconsistent_min_max": int(inconsistent.sum()),
+        "summary_values_masked": summary_masked,
+        "unparsed_timestamps": int(df[TIMESTAMP_COLUMNS].isna().any(axis=1).sum()),
+        "rows_per_pollutant": {str(k): int(v) for k, v in df['Sensor Parameter'].value_counts().items()},
+    })
+    return df, report
+
+
+def read_raw(path=DATA_PATH):
+    """Read a dataset CSV (path or binary buffer) as untyped strings, treating empty and "N/A" cells as missing."""
+    return pd.read_csv(path, dtype=str, keep_default_na=False, na_values=["", "N/A"])
+
+
+def publish_validated(raw_df, path=DATA_PATH):
+    """Validate raw_df, publish it as the dataset and write the quality report next to it."""
+    clean_df, report = validate(raw_df)
+    # The normalized month is derived again whenever the store is built, so it is not saved
+    report["data_version"] = publish_dataset(clean_df.drop(columns=[MONTH_COLUMN]), path)
+    with open(f"{path}.quality.json", "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    return clean_df, report
+
+
+if __name__ == "__main__":
+    # Re-validate an existing CSV in place: python validation.py [path]
+    path = sys.argv[1] if len(sys.argv) > 1 else DATA_PATH
+    _, report = publish_validated(read_raw(path), path)
+    print(json.dumps(report, indent=2, ensure_ascii=False))